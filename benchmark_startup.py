@@ -0,0 +1,53 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules to benchmark (entry points and the modules imported by worker processes)
+modules = ['merge_dataframes', 'merge_segment_data', 'preprocess_and_save_merged_iax',
+           'preprocess_and_save_merged_imembrane', 'utils', 'preprocess_intrinsic_currents',
+           'preprocess_synaptic_currents', 'merge_dendrite_iax', 'merge_dendrite_imembrane']
+heavy_modules = ['pandas', 'networkx', 'tqdm']
+repeats = 10
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+python_path = os.pathsep.join([repo_dir, os.path.join(repo_dir, 'dendrite_centric_preprocessing')])
+
+
+def time_import(module, repeats):
+    """
+    Measures the wall-clock time of starting a fresh interpreter and importing the given module.
+
+    Parameters:
+        module (str): The name of the module to import.
+        repeats (int): The number of fresh interpreters to start.
+
+    Returns:
+        times (list of float): The startup times in seconds.
+        loaded (list of str): The heavy modules (pandas, networkx, tqdm) loaded by the import.
+    """
+    code = f"import sys, {module}; print(','.join(m for m in {heavy_modules!r} if m in sys.modules))"
+    env = dict(os.environ, PYTHONPATH=python_path)
+
+    times = []
+    loaded = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - t0)
+        loaded = [m for m in result.stdout.strip().split(',') if m]
+    return times, loaded
+
+
+def main():
+    baseline, _ = time_import('os', repeats)
+    print(f"{'interpreter (import os)':<40} {statistics.median(baseline) * 1000:8.1f} ms")
+
+    for module in modules:
+        times, loaded = time_import(module, repeats)
+        print(f"{module:<40} {statistics.median(times) * 1000:8.1f} ms   heavy modules loaded: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
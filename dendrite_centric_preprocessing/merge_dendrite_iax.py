@@ -1,8 +1,13 @@
+from __future__ import annotations
+
 import os
-import pandas as pd
-import networkx as nx
+from typing import TYPE_CHECKING
+
 from utils import load_df, create_directed_graph
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 def merge_dendritic_section_iax(df: pd.DataFrame, section: str) -> pd.DataFrame:
     """
@@ -29,6 +34,7 @@ def merge_dendritic_section_iax(df: pd.DataFrame, section: str) -> pd.DataFrame:
    - Internal axial current connections, both as reference and parent, are removed from the dataframe.
    - The function specifically renames certain index values that correspond to internal and section-end-external segments.
    """
+    import pandas as pd
     # Select external iax connections (between parent and children nodes)
     df_segment_ref = df[df.index.get_level_values('ref').str.startswith(f'{section}(')]  # select iax rows where segment is the reference
     df_segment_par = df[df.index.get_level_values('par').str.startswith(f'{section}(')]  # select iax rows where segment is the parent
@@ -78,6 +84,8 @@ def update_root_node(df_merged: pd.DataFrame, section: str) -> pd.DataFrame:
       are multiplied by -1 to reflect the change in direction.
     - The resulting dataframe is re-indexed and returned, with the reference ('ref') and parent ('par') columns properly set.
     """
+    import pandas as pd
+    import networkx as nx
     # The input of this function should be a dataframe where the new root node is a section where the segment values are already merged
     dg = create_directed_graph(df_merged, df_merged.columns[0])
     g = dg.to_undirected()
@@ -1,7 +1,13 @@
+from __future__ import annotations
+
 import os
-import pandas as pd
+from typing import TYPE_CHECKING
+
 from utils import load_df
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 def merge_dendritic_section_imembrane(df: pd.DataFrame, section: str) -> pd.DataFrame:
     """
     Merges data for a specific dendritic section, summing  the values for each `itype` across the segments of the section
@@ -22,6 +28,7 @@ def merge_dendritic_section_imembrane(df: pd.DataFrame, section: str) -> pd.Data
         A new DataFrame that combines the original data excluding the selected dendritic section and the summed data
         for that section grouped by `itype`. The new DataFrame has the dendritic segment and `itype` as a two-level index.
     """
+    import pandas as pd
     df_dend = df[df.index.get_level_values(0).str.startswith(f'{section}(')]  # select all rows belonging to the given segment
     df_summed_by_itype = df_dend.groupby(level='itype').sum()  # sum dataframe by current type for each time point
     df_summed_by_itype = df_summed_by_itype.reset_index()
@@ -1,9 +1,8 @@
 import os
 import numpy as np
-from tqdm import tqdm
 
 from merge_dendrite_iax import merge_dendritic_section_iax, update_root_node
-from utils import load_df
+from utils import load_df, append_to_manifest, clear_chunks, load_stage_manifest, chunk_signature
 
 
 # Input and output parameters
@@ -12,22 +11,40 @@ index_file_path = os.path.join(data_dir, 'multiindex_merged_soma.csv')
 output_dir = 'E:/cluster_seed30/preprocessed_data/dendrite_centric/axial_currents_merged_dendrite'
 section = 'dend5_0111111111111111111'
 
-# Ensure the index is saved only once
-index_saved = False
+# Incremental mode: only process chunks that are not listed in the stage manifest, or whose input chunk changed
+incremental = False
+manifest_columns = ['chunk_file', 'source_file', 'source_size', 'source_mtime']
 
-def process_all_files(index_file_path, data_dir, output_dir):
+def process_all_files(index_file_path, data_dir, output_dir, incremental=False):
     """
     Processes all axial current chunks in the directory and saves the results.
     """
-    global index_saved
+    from tqdm import tqdm
+
+    # Ensure the index is saved only once
+    index_saved = False
 
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
+    index_output_file = os.path.join(output_dir, 'multiindex_merged_dendrite.csv')
+    if incremental:
+        index_saved = os.path.exists(index_output_file)
+        manifest = load_stage_manifest(output_dir, 'merged_dendrite_values_', data_dir, 'merged_soma_values_', manifest_columns)
+        processed_chunks = set(manifest['source_file'])
+    else:
+        clear_chunks(output_dir, 'merged_dendrite_values_')  # full rebuild: remove chunks and manifest of earlier runs
+        processed_chunks = set()
+
     # Loop through all chunk files in the data directory
     for chunk_file in tqdm(sorted(os.listdir(data_dir))):
         if chunk_file.startswith('merged_soma_values_') and chunk_file.endswith('.npy'):
             chunk_path = os.path.join(data_dir, chunk_file)
+            chunk_number = chunk_file.split('_')[-1].split('.')[0]  # Extract chunk number
+            chunk_output_file = os.path.join(output_dir, f"merged_dendrite_values_{chunk_number}.npy")
+            if chunk_file in processed_chunks:
+                continue
+            source_size, source_mtime = chunk_signature(chunk_path)
 
             # Merge dendritic segments
             df = load_df(index_file_path, chunk_path)
@@ -35,14 +52,18 @@ def process_all_files(index_file_path, data_dir, output_dir):
             df_updated_root = update_root_node(df_merged, section)
 
             # Save the updated values chunk
-            chunk_number = chunk_file.split('_')[-1].split('.')[0]  # Extract chunk number
-            chunk_output_file = os.path.join(output_dir, f"merged_dendrite_values_{chunk_number}.npy")
             np.save(chunk_output_file, df_updated_root.values)
+            append_to_manifest(output_dir, [(os.path.basename(chunk_output_file), chunk_file, source_size, source_mtime)], manifest_columns)
 
             # Save the index only once
             if not index_saved:
-                index_output_file = os.path.join(output_dir, 'multiindex_merged_dendrite.csv')
                 df_updated_root.index.to_frame().reset_index(drop=True).to_csv(index_output_file, index=False)
                 index_saved = True
 
-process_all_files(index_file_path, data_dir, output_dir)
\ No newline at end of file
+
+def main():
+    process_all_files(index_file_path, data_dir, output_dir, incremental)
+
+
+if __name__ == '__main__':
+    main()
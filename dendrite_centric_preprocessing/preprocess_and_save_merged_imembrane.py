@@ -1,9 +1,8 @@
 import os
 import numpy as np
-from tqdm import tqdm
 
 from merge_dendrite_imembrane import merge_dendritic_section_imembrane
-from utils import load_df
+from utils import load_df, append_to_manifest, clear_chunks, load_stage_manifest, chunk_signature
 
 
 # Input and output parameters
@@ -12,10 +11,11 @@ index_file_path = os.path.join(data_dir, 'multiindex_merged_soma.csv')
 output_dir = 'E:/cluster_seed30/preprocessed_data/dendrite_centric/membrane_currents_merged_dendrite'
 section = 'dend5_0111111111111111111'
 
-# Ensure the index is saved only once
-index_saved = False
+# Incremental mode: only process chunks that are not listed in the stage manifest, or whose input chunk changed
+incremental = False
+manifest_columns = ['chunk_file', 'source_file', 'source_size', 'source_mtime']
 
-def process_all_files(index_file_path, data_dir, output_dir):
+def process_all_files(index_file_path, data_dir, output_dir, incremental=False):
     """
     Processes all membrane current value chunks in the directory and saves the results.
 
@@ -27,33 +27,56 @@ def process_all_files(index_file_path, data_dir, output_dir):
         index (df): The multiindex DataFrame containing 'segment' and 'itype' columns.
         data_dir (str): The directory containing `multiindex.csv` and the `.npy` value chunks.
         output_dir (str): The directory where the processed files will be saved.
+        incremental (bool): If True, chunks listed in the stage manifest with an unchanged input chunk are skipped and left untouched.
 
     Returns:
         None: Saves the processed chunks and the merged index to the output directory.
         """
-    global index_saved
+    from tqdm import tqdm
+
+    # Ensure the index is saved only once
+    index_saved = False
 
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
+    index_output_file = os.path.join(output_dir, 'multiindex_merged_dendrite.csv')
+    if incremental:
+        index_saved = os.path.exists(index_output_file)
+        manifest = load_stage_manifest(output_dir, 'merged_dendrite_values_', data_dir, 'merged_soma_values_', manifest_columns)
+        processed_chunks = set(manifest['source_file'])
+    else:
+        clear_chunks(output_dir, 'merged_dendrite_values_')  # full rebuild: remove chunks and manifest of earlier runs
+        processed_chunks = set()
+
     # Loop through all chunk files in the data directory
     for chunk_file in tqdm(sorted(os.listdir(data_dir))):
         if chunk_file.startswith('merged_soma_values_') and chunk_file.endswith('.npy'):
             chunk_path = os.path.join(data_dir, chunk_file)
+            chunk_number = chunk_file.split('_')[-1].split('.')[0]  # Extract chunk number
+            chunk_output_file = os.path.join(output_dir, f"merged_dendrite_values_{chunk_number}.npy")
+            if chunk_file in processed_chunks:
+                continue
+            source_size, source_mtime = chunk_signature(chunk_path)
 
             # Merge dendritic segments
             df = load_df(index_file_path, chunk_path)
             df_merged_dendritic_segments = merge_dendritic_section_imembrane(df, section)
 
             # Save the updated values chunk
-            chunk_number = chunk_file.split('_')[-1].split('.')[0]  # Extract chunk number
-            chunk_output_file = os.path.join(output_dir, f"merged_dendrite_values_{chunk_number}.npy")
             np.save(chunk_output_file, df_merged_dendritic_segments.values)
+            append_to_manifest(output_dir, [(os.path.basename(chunk_output_file), chunk_file, source_size, source_mtime)], manifest_columns)
 
             # Save the index only once
             if not index_saved:
-                index_output_file = os.path.join(output_dir, 'multiindex_merged_dendrite.csv')
                 df_merged_dendritic_segments.index.to_frame().reset_index(drop=True).to_csv(index_output_file, index=False)
                 index_saved = True
 
-process_all_files(index_file_path, data_dir, output_dir)
+
+def main():
+    process_all_files(index_file_path, data_dir, output_dir, incremental)
+
+
+if __name__ == '__main__':
+    main()
+
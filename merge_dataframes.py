@@ -1,54 +1,111 @@
 import time
 
-import pandas as pd
 import numpy as np
 import os
 import gc
 
 from preprocess_intrinsic_currents import preprocess_intrinsic_currents
 from preprocess_synaptic_currents import preprocess_synaptic_currents
-from utils import save_in_chunks
+from utils import save_in_chunks, append_to_manifest, clear_chunks, load_ingest_manifest, tile_chunks
 
 
 input_dir = 'L:/cluster_seed30/raw_data'
 intrinsic_currents = ['nax', 'nad', 'kap', 'kad', 'kdr', 'kslow', 'car', 'passive', 'capacitive']
 synaptic_currents = ['AMPA', 'NMDA', 'GABA', 'GABA_B']
-segment_area = pd.read_csv(input_dir + '/segment_area.csv', index_col=0)
 
-dfs_intrinsic = preprocess_intrinsic_currents(input_dir, intrinsic_currents, segment_area)
-dfs_synaptic = preprocess_synaptic_currents(input_dir, synaptic_currents)
+output_dir = "L:/cluster_seed30/preprocessed_data/membrane_currents"
+# Optionally also save a segment-major tiled layout (row blocks x time blocks) for per-segment reads
+tiled = False
+tiles_dir = "L:/cluster_seed30/preprocessed_data/membrane_currents_tiled"
+# Incremental mode: only process timepoints that are not yet listed in the manifest and append new chunks
+incremental = False
+manifest_columns = ['chunk_file', 'col_start', 'col_stop']
 
-# Create merged dataframe
-dfs = dfs_intrinsic + dfs_synaptic
-del dfs_intrinsic, dfs_synaptic
-gc.collect()
 
-df_im = pd.concat(dfs)
-del dfs
-gc.collect()
+def count_timepoints(data_dir, intrinsic_currents, synaptic_currents):
+    """
+    Returns the number of timepoints available in all raw intrinsic and synaptic current arrays.
+    While a simulation is still writing, the arrays can have different lengths, so the shortest one is used.
+    The arrays are memory-mapped, so only the headers are read.
+    """
+    paths = [data_dir + f'/intrinsic_currents/{curr}_currents.npy' for curr in intrinsic_currents]
+    paths += [data_dir + f'/synaptic_currents/{curr}_currents.npy' for curr in synaptic_currents]
+    return min(np.load(path, mmap_mode='r').shape[1] for path in paths)
 
-df_im['index'] = df_im['index'].astype('category')
-df_im['itype'] = df_im['itype'].astype('category')
 
-# Calculate and set multiindex
-segments = df_im['index'].unique()
-itypes = df_im['itype'].unique()
+def ingest_timepoints(start, stop, first_chunk):
+    """
+    Preprocesses the raw intrinsic and synaptic currents between timepoints `start` and `stop`, and
+    saves them as chunks (numbered from `first_chunk`) listed in the manifest of `output_dir`.
+    """
+    import pandas as pd
 
-multi_index = pd.MultiIndex.from_product([segments, itypes], names=['segment', 'itype'])
-df_im_combined = df_im.set_index(['index', 'itype']).reindex(multi_index)
-del df_im
-gc.collect()
+    segment_area = pd.read_csv(input_dir + '/segment_area.csv', index_col=0)
 
-df_im_combined = df_im_combined.fillna(0)
-df_im_combined.columns = df_im_combined.columns.astype(int)
+    dfs_intrinsic = preprocess_intrinsic_currents(input_dir, intrinsic_currents, segment_area, start=start, stop=stop)
+    dfs_synaptic = preprocess_synaptic_currents(input_dir, synaptic_currents, start=start, stop=stop)
 
-output_dir = "L:/cluster_seed30/preprocessed_data/membrane_currents"
-# Save multiindex as a dataframe
-index_df = pd.DataFrame(df_im_combined.index.tolist(), columns=['segment', 'itype'])
-os.makedirs(output_dir, exist_ok=True)
-index_file = os.path.join(output_dir, "multiindex.csv")
-index_df.to_csv(index_file, index=False)
-
-# Save current values as arrays
-current_values = df_im_combined.values
-save_in_chunks(current_values, output_dir, chunk_size=20000)
+    # Create merged dataframe
+    dfs = dfs_intrinsic + dfs_synaptic
+    del dfs_intrinsic, dfs_synaptic
+    gc.collect()
+
+    df_im = pd.concat(dfs)
+    del dfs
+    gc.collect()
+
+    df_im['index'] = df_im['index'].astype('category')
+    df_im['itype'] = df_im['itype'].astype('category')
+
+    # Calculate and set multiindex (reuse the saved multiindex when appending, so that rows match existing chunks)
+    index_file = os.path.join(output_dir, "multiindex.csv")
+    if start > 0:
+        multi_index = pd.MultiIndex.from_frame(pd.read_csv(index_file))
+    else:
+        segments = df_im['index'].unique()
+        itypes = df_im['itype'].unique()
+        multi_index = pd.MultiIndex.from_product([segments, itypes], names=['segment', 'itype'])
+    df_im_combined = df_im.set_index(['index', 'itype']).reindex(multi_index)
+    del df_im
+    gc.collect()
+
+    df_im_combined = df_im_combined.fillna(0)
+    df_im_combined.columns = df_im_combined.columns.astype(int)
+
+    # Save multiindex as a dataframe
+    index_df = pd.DataFrame(df_im_combined.index.tolist(), columns=['segment', 'itype'])
+    os.makedirs(output_dir, exist_ok=True)
+    if start == 0:
+        index_df.to_csv(index_file, index=False)
+
+    # Save current values as arrays
+    current_values = df_im_combined.values
+    chunks = save_in_chunks(current_values, output_dir, chunk_size=20000, first_chunk=first_chunk)
+    append_to_manifest(output_dir, [(f, start + s, start + e) for f, s, e in chunks], manifest_columns)
+
+
+def main():
+    start = 0
+    first_chunk = 0
+    stop = count_timepoints(input_dir, intrinsic_currents, synaptic_currents)
+    if incremental:
+        manifest = load_ingest_manifest(output_dir, 'current_values_chunk_', manifest_columns)
+        if len(manifest):
+            start = int(manifest['col_stop'].max())
+            first_chunk = len(manifest)
+    else:
+        clear_chunks(output_dir, 'current_values_chunk_')  # full rebuild: remove chunks and manifest of earlier runs
+
+    if start < stop:
+        ingest_timepoints(start, stop, first_chunk)
+    else:
+        print(f"No new timepoints after {start}, nothing to process")
+
+    # Tile the chunks recorded in the manifest (also catches up on chunks that were not tiled yet)
+    if tiled:
+        tile_chunks(output_dir, 'current_values_chunk_', os.path.join(output_dir, 'multiindex.csv'), tiles_dir,
+                    row_block=256, col_block=20000, incremental=incremental)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,19 @@
 import os
-import pandas as pd
 import numpy as np
 
+from utils import append_to_manifest, clear_chunks, load_stage_manifest, chunk_signature, tile_chunks
+
 # Input directory and files
 data_dir = 'L:/cluster_seed30/preprocessed_data/membrane_currents'
 index_file = os.path.join(data_dir, 'multiindex.csv')
 output_dir = 'L:/cluster_seed30/preprocessed_data/merged_soma'
+# Optionally also save a segment-major tiled layout (row blocks x time blocks) for per-segment reads
+tiled = False
+tiles_dir = 'L:/cluster_seed30/preprocessed_data/merged_soma_tiled'
 
-# Load the index once
-index = pd.read_csv(index_file)
-
-# Ensure the index is saved only once
-index_saved = False
+# Incremental mode: only process chunks that are not listed in the stage manifest, or whose input chunk changed
+incremental = False
+manifest_columns = ['chunk_file', 'source_file', 'source_size', 'source_mtime']
 
 
 def merge_soma_segments(index, values):
@@ -24,6 +26,7 @@ def merge_soma_segments(index, values):
         Returns:
             df_updated (df): A DataFrame with soma segments merged and other segments preserved.
     """
+    import pandas as pd
     # Create a DataFrame
     multiindex = pd.MultiIndex.from_frame(index)
     df = pd.DataFrame(data=values, index=multiindex)
@@ -45,7 +48,7 @@ def merge_soma_segments(index, values):
     return df_updated
 
 
-def process_all_files(index, data_dir, output_dir):
+def process_all_files(index, data_dir, output_dir, incremental=False):
     """
         Processes all membrane current value chunks in the directory and saves the results.
 
@@ -57,19 +60,35 @@ def process_all_files(index, data_dir, output_dir):
             index (df): The multiindex DataFrame containing 'segment' and 'itype' columns.
             data_dir (str): The directory containing `multiindex.csv` and the `.npy` value chunks.
             output_dir (str): The directory where the processed files will be saved.
+            incremental (bool): If True, chunks listed in the stage manifest with an unchanged input chunk are skipped and left untouched.
 
         Returns:
             None: Saves the processed chunks and the merged index to the output directory.
         """
-    global index_saved
+    # Ensure the index is saved only once
+    index_saved = False
 
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
+    index_output_file = os.path.join(output_dir, 'multiindex_merged_soma.csv')
+    if incremental:
+        index_saved = os.path.exists(index_output_file)
+        manifest = load_stage_manifest(output_dir, 'merged_soma_values', data_dir, 'current_values_chunk_', manifest_columns)
+        processed_chunks = set(manifest['source_file'])
+    else:
+        clear_chunks(output_dir, 'merged_soma_values')  # full rebuild: remove chunks and manifest of earlier runs
+        processed_chunks = set()
+
     # Loop through all chunk files in the data directory
     for chunk_file in sorted(os.listdir(data_dir)):
         if chunk_file.startswith('current_values_chunk_') and chunk_file.endswith('.npy'):
             chunk_path = os.path.join(data_dir, chunk_file)
+            chunk_number = chunk_file.split('_')[-1].split('.')[0]  # Extract chunk number
+            chunk_output_file = os.path.join(output_dir, f"merged_soma_values{chunk_number}.npy")
+            if chunk_file in processed_chunks:
+                continue
+            source_size, source_mtime = chunk_signature(chunk_path)
 
             # Load the current values chunk
             values = np.load(chunk_path)
@@ -78,16 +97,28 @@ def process_all_files(index, data_dir, output_dir):
             df_updated = merge_soma_segments(index, values)
 
             # Save the updated values chunk
-            chunk_number = chunk_file.split('_')[-1].split('.')[0]  # Extract chunk number
-            chunk_output_file = os.path.join(output_dir, f"merged_soma_values{chunk_number}.npy")
             np.save(chunk_output_file, df_updated.values)
+            append_to_manifest(output_dir, [(os.path.basename(chunk_output_file), chunk_file, source_size, source_mtime)], manifest_columns)
 
             # Save the index only once
             if not index_saved:
-                index_output_file = os.path.join(output_dir, 'multiindex_merged_soma.csv')
                 df_updated.index.to_frame().reset_index(drop=True).to_csv(index_output_file, index=False)
                 index_saved = True
 
 
-# Process all chunks
-process_all_files(index, data_dir, output_dir)
+def main():
+    import pandas as pd
+
+    # Load the index once
+    index = pd.read_csv(index_file)
+
+    # Process all chunks
+    process_all_files(index, data_dir, output_dir, incremental)
+
+    if tiled:
+        tile_chunks(output_dir, 'merged_soma_values', os.path.join(output_dir, 'multiindex_merged_soma.csv'), tiles_dir,
+                    incremental=incremental)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,10 @@
+from __future__ import annotations
+
 import numpy as np
-import pandas as pd
-from tqdm import tqdm
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def change_unit_na(currents: pd.DataFrame, area: pd.DataFrame) -> pd.DataFrame:
@@ -14,6 +18,7 @@ def change_unit_na(currents: pd.DataFrame, area: pd.DataFrame) -> pd.DataFrame:
     Returns
         df_converted (df): DataFrame containing membrane currents in nA.
     """
+    import pandas as pd
     array_converted = np.zeros_like(currents.values)
     for i, segment in enumerate(currents.index):
         segment_area = area.loc[segment].values[0]
@@ -25,7 +30,7 @@ def change_unit_na(currents: pd.DataFrame, area: pd.DataFrame) -> pd.DataFrame:
     return df_converted
 
 
-def preprocess_intrinsic_currents(data_dir, currents, area):
+def preprocess_intrinsic_currents(data_dir, currents, area, start=0, stop=None):
     """
     Preprocess intrinsic current data by converting units, and organizing it into dataframes.
 
@@ -40,6 +45,13 @@ def preprocess_intrinsic_currents(data_dir, currents, area):
         area (df):
             A DataFrame containing segment area information, which is used to convert the raw current values.
 
+        start (int):
+            The first timepoint to process (default is 0). Used in incremental mode to read only new timepoints.
+
+        stop (int):
+            The timepoint after the last one to process (default is the end of the array). All current types must
+            be read up to the same timepoint, since the raw arrays can have different lengths during a simulation.
+
     Returns:
         dfs (list of df):
             A list of DataFrames, where each DataFrame corresponds to a processed intrinsic current type.
@@ -50,12 +62,15 @@ def preprocess_intrinsic_currents(data_dir, currents, area):
 
     Notes:
     - The function reads `.npy` files for segment indices and corresponding current values.
+    - Current arrays are memory-mapped, so only the timepoints from `start` to `stop` are read.
     - Columns 'index' and 'itype' are optimized by converting them to categorical data types for memory efficiency.
     """
+    import pandas as pd
+    from tqdm import tqdm
     dfs = []
     for curr in tqdm(currents):
         segments = np.load(data_dir + f'/intrinsic_segments/{curr}_segments.npy').astype(str)
-        values = np.load(data_dir + f'/intrinsic_currents/{curr}_currents.npy').astype(np.float32)
+        values = np.load(data_dir + f'/intrinsic_currents/{curr}_currents.npy', mmap_mode='r')[:, start:stop].astype(np.float32)
         df = pd.DataFrame(data=values, index=segments)
         df_converted = change_unit_na(df, area)
         df_converted.insert(1, 'itype', curr)
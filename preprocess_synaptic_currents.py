@@ -1,9 +1,7 @@
 import numpy as np
-import pandas as pd
-from tqdm import tqdm
 
 
-def preprocess_synaptic_currents(data_dir, currents):
+def preprocess_synaptic_currents(data_dir, currents, start=0, stop=None):
     """
         Preprocess synaptic current data by summing over segments, and organizing it into DataFrames.
         Parameters:
@@ -14,6 +12,13 @@ def preprocess_synaptic_currents(data_dir, currents):
             currents (list of str):
                 A list of synaptic current types to process.
 
+            start (int):
+                The first timepoint to process (default is 0). Used in incremental mode to read only new timepoints.
+
+            stop (int):
+                The timepoint after the last one to process (default is the end of the array). All current types must
+                be read up to the same timepoint, since the raw arrays can have different lengths during a simulation.
+
         Returns:
             dfs (list of df):
                 A list of DataFrames, where each DataFrame corresponds to a processed synaptic current type.
@@ -25,11 +30,14 @@ def preprocess_synaptic_currents(data_dir, currents):
         Notes:
         - The data is grouped and summed over unique segments using the `groupby` method.
         - Columns 'index' and 'itype' are converted to categorical data types to optimize memory usage.
+        - Current arrays are memory-mapped, so only the timepoints from `start` to `stop` are read.
         """
+    import pandas as pd
+    from tqdm import tqdm
     dfs = []
     for curr in tqdm(currents):
         segments = np.load(data_dir + f'/synaptic_segments/{curr}_segments.npy').astype(str)
-        values = np.load(data_dir + f'/synaptic_currents/{curr}_currents.npy').astype(np.float32)
+        values = np.load(data_dir + f'/synaptic_currents/{curr}_currents.npy', mmap_mode='r')[:, start:stop].astype(np.float32)
         df = pd.DataFrame(data=values, index=segments)
         df = df.reset_index()
         df_summed = df.groupby('index', as_index=False).sum()
@@ -1,10 +1,16 @@
+from __future__ import annotations
+
 import numpy as np
-import pandas as pd
-import networkx as nx
 import os
+import shutil
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import networkx as nx
 
 
-def save_in_chunks(current_values, output_dir, chunk_size=None):
+def save_in_chunks(current_values, output_dir, chunk_size=None, first_chunk=0):
     """
     Save the current_values array in chunks along the columns to the specified output directory.
 
@@ -12,6 +18,10 @@ def save_in_chunks(current_values, output_dir, chunk_size=None):
         current_values (numpy.ndarray): The array of numerical values to be saved.
         output_dir (str): The directory where the chunks will be saved.
         chunk_size (int): The number of columns to save per chunk (default is all columns).
+        first_chunk (int): The number of the first chunk file (default is 0, used when appending chunks).
+
+    Returns:
+        chunks (list of tuple): (chunk file name, first column, last column + 1) for each saved chunk.
     """
     os.makedirs(output_dir, exist_ok=True)
 
@@ -21,16 +31,424 @@ def save_in_chunks(current_values, output_dir, chunk_size=None):
 
     num_chunks = current_values.shape[1] // chunk_size + (1 if current_values.shape[1] % chunk_size != 0 else 0)
 
+    chunks = []
     for i in range(num_chunks):
         start_idx = i * chunk_size
         end_idx = min((i + 1) * chunk_size, current_values.shape[1])
 
         chunk_values = current_values[:, start_idx:end_idx]
 
-        chunk_file = os.path.join(output_dir, f"current_values_chunk_{i}.npy")
+        chunk_name = f"current_values_chunk_{first_chunk + i}.npy"
+        chunk_file = os.path.join(output_dir, chunk_name)
 
         np.save(chunk_file, chunk_values)
-        print(f"Saved column chunk {i} to {chunk_file}")
+        chunks.append((chunk_name, start_idx, end_idx))
+        print(f"Saved column chunk {first_chunk + i} to {chunk_file}")
+    return chunks
+
+
+def read_manifest(output_dir: str, columns: list) -> pd.DataFrame:
+    """
+    Reads the manifest (`manifest.csv`) listing the chunk files already written to an output directory.
+
+    Parameters:
+        output_dir (str): The directory containing the chunk files.
+        columns (list of str): The manifest columns, used to create an empty manifest if none exists yet.
+
+    Returns:
+        pd.DataFrame: The manifest, with one row per chunk file.
+    """
+    import pandas as pd
+    manifest_file = os.path.join(output_dir, 'manifest.csv')
+    if not os.path.exists(manifest_file):
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(manifest_file)
+
+
+def append_to_manifest(output_dir: str, rows: list, columns: list):
+    """
+    Appends rows for newly written chunk files to the manifest (`manifest.csv`) of an output directory.
+
+    Parameters:
+        output_dir (str): The directory containing the chunk files.
+        rows (list of tuple): The manifest rows to append, in the order of `columns`.
+        columns (list of str): The manifest columns.
+    """
+    import pandas as pd
+    manifest_file = os.path.join(output_dir, 'manifest.csv')
+    df_rows = pd.DataFrame(rows, columns=columns)
+    df_rows.to_csv(manifest_file, mode='a', index=False, header=not os.path.exists(manifest_file))
+
+
+def list_chunk_files(directory: str, prefix: str) -> list:
+    """
+    Lists the `.npy` chunk files starting with `prefix` in a directory, sorted by chunk number.
+
+    Parameters:
+        directory (str): The directory containing the chunk files.
+        prefix (str): The file name prefix of the chunks (e.g. 'current_values_chunk_').
+
+    Returns:
+        list of str: The chunk file names, sorted by chunk number.
+    """
+    chunk_files = [f for f in os.listdir(directory) if f.startswith(prefix) and f.endswith('.npy')]
+    return sorted(chunk_files, key=lambda f: chunk_number(f, prefix))
+
+
+def chunk_number(chunk_file: str, prefix: str) -> int:
+    """
+    Extracts the chunk number from a chunk file name (e.g. 3 from 'current_values_chunk_3.npy').
+
+    Parameters:
+        chunk_file (str): The chunk file name.
+        prefix (str): The file name prefix of the chunks.
+
+    Returns:
+        int: The chunk number.
+    """
+    return int(chunk_file[len(prefix):-len('.npy')].lstrip('_'))
+
+
+def clear_chunks(output_dir: str, prefix: str):
+    """
+    Removes the manifest and all chunk files starting with `prefix` from an output directory,
+    so that a full rebuild does not leave chunks of an earlier run behind.
+
+    Parameters:
+        output_dir (str): The directory containing the chunk files.
+        prefix (str): The file name prefix of the chunks.
+    """
+    if not os.path.isdir(output_dir):
+        return
+    manifest_file = os.path.join(output_dir, 'manifest.csv')
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+    for chunk_file in list_chunk_files(output_dir, prefix):
+        os.remove(os.path.join(output_dir, chunk_file))
+
+
+def is_complete_chunk(path: str) -> bool:
+    """
+    Checks whether a `.npy` chunk file can be read, i.e. it was not truncated by a crash during `np.save`.
+    Only the header is read (the file is memory-mapped).
+
+    Parameters:
+        path (str): The path of the chunk file.
+
+    Returns:
+        bool: True if the header is valid and the file contains all values it declares.
+    """
+    try:
+        np.load(path, mmap_mode='r')
+    except (ValueError, EOFError, OSError):
+        return False
+    return True
+
+
+def load_ingest_manifest(output_dir: str, prefix: str, columns: list) -> pd.DataFrame:
+    """
+    Loads the manifest of the ingested chunks, listing each chunk and its column (timepoint) range.
+    If no manifest exists but chunk files do (e.g. output of an earlier full run), the manifest is
+    reconstructed from the chunk shapes. Reconstruction stops at the first chunk that cannot be read
+    (e.g. a run interrupted while saving); that chunk and all later ones are removed, so ingestion
+    resumes from there.
+
+    Parameters:
+        output_dir (str): The directory containing the chunk files.
+        prefix (str): The file name prefix of the chunks (e.g. 'current_values_chunk_').
+        columns (list of str): The manifest columns (chunk file, first column, last column + 1).
+
+    Returns:
+        pd.DataFrame: The manifest, with one row per chunk.
+    """
+    manifest = read_manifest(output_dir, columns)
+    if len(manifest) or not os.path.isdir(output_dir):
+        return manifest
+
+    chunk_files = list_chunk_files(output_dir, prefix)
+    rows = []
+    col_start = 0
+    for i, chunk_file in enumerate(chunk_files):
+        chunk_path = os.path.join(output_dir, chunk_file)
+        if not is_complete_chunk(chunk_path):
+            for incomplete_file in chunk_files[i:]:
+                os.remove(os.path.join(output_dir, incomplete_file))
+            break
+        n_cols = np.load(chunk_path, mmap_mode='r').shape[1]
+        rows.append((chunk_file, col_start, col_start + n_cols))
+        col_start += n_cols
+    if rows:
+        append_to_manifest(output_dir, rows, columns)
+    return read_manifest(output_dir, columns)
+
+
+def chunk_signature(path: str) -> tuple:
+    """
+    Returns the size and modification time of a chunk file. Recorded in stage manifests to detect
+    input chunks that were rewritten (e.g. by a full rebuild of an earlier stage) under the same name.
+
+    Parameters:
+        path (str): The path of the chunk file.
+
+    Returns:
+        tuple: (size in bytes, modification time in nanoseconds).
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_stage_manifest(output_dir: str, output_prefix: str, source_dir: str, source_prefix: str,
+                        columns: list) -> pd.DataFrame:
+    """
+    Loads the manifest of a processing stage, listing each output chunk, the input chunk it was created from,
+    and the size and modification time of that input chunk (see `chunk_signature`).
+
+    If no manifest exists but output chunks do (e.g. output of an earlier full run), the manifest is
+    reconstructed from the chunk files, using the current signature of their input chunks. Chunks that cannot
+    be read (e.g. truncated by a crash) are left out, so they are processed again.
+
+    Rows whose input chunk was removed or rewritten since it was processed are dropped from the manifest and
+    their output chunks are removed, so they are processed again (or not at all, if the input no longer exists).
+
+    Parameters:
+        output_dir (str): The directory containing the output chunk files.
+        output_prefix (str): The file name prefix of the output chunks.
+        source_dir (str): The directory containing the input chunk files.
+        source_prefix (str): The file name prefix of the corresponding input chunks.
+        columns (list of str): The manifest columns (output chunk file, input chunk file, input size, input modification time).
+
+    Returns:
+        pd.DataFrame: The manifest, with one row per up-to-date output chunk.
+    """
+    manifest = read_manifest(output_dir, columns)
+    manifest_file = os.path.join(output_dir, 'manifest.csv')
+    if list(manifest.columns) != list(columns):  # manifest without input signatures, rebuild it
+        os.remove(manifest_file)
+        manifest = read_manifest(output_dir, columns)
+    if not os.path.isdir(output_dir):
+        return manifest
+
+    if not len(manifest):
+        rows = []
+        for chunk_file in list_chunk_files(output_dir, output_prefix):
+            chunk_number = chunk_file[len(output_prefix):-len('.npy')].lstrip('_')
+            source_file = f"{source_prefix}{chunk_number}.npy"
+            source_path = os.path.join(source_dir, source_file)
+            if not is_complete_chunk(os.path.join(output_dir, chunk_file)) or not os.path.exists(source_path):
+                continue
+            rows.append((chunk_file, source_file) + chunk_signature(source_path))
+        if rows:
+            append_to_manifest(output_dir, rows, columns)
+        return read_manifest(output_dir, columns)
+
+    # Drop rows (and output chunks) whose input chunk was removed or rewritten
+    up_to_date = []
+    for row in manifest.itertuples(index=False):
+        source_path = os.path.join(source_dir, row[1])
+        is_up_to_date = os.path.exists(source_path) and chunk_signature(source_path) == (row[2], row[3])
+        if not is_up_to_date and os.path.exists(os.path.join(output_dir, row[0])):
+            os.remove(os.path.join(output_dir, row[0]))
+        up_to_date.append(is_up_to_date)
+    if not all(up_to_date):
+        manifest = manifest[up_to_date]
+        manifest.to_csv(manifest_file, index=False)
+    return manifest
+
+
+def save_in_tiles(current_values, output_dir, row_block=256, col_block=20000, col_offset=0):
+    """
+    Save the current_values array as 2D tiles (row blocks x time blocks) together with a tile index.
+
+    Unlike `save_in_chunks`, which slices only along the columns, this layout allows reading the
+    full time course of a few rows without loading every row of every chunk.
+
+    Parameters:
+        current_values (numpy.ndarray): The array of numerical values to be saved.
+        output_dir (str): The directory where the tiles and `tile_index.csv` will be saved.
+        row_block (int): The number of rows to save per tile (default is 256).
+        col_block (int): The number of columns (timepoints) to save per tile (default is 20000).
+        col_offset (int): The timepoint of the first column (default is 0). If greater than 0, the tiles are
+            appended to the existing tile index (used when appending new timepoints).
+    """
+    import pandas as pd
+    os.makedirs(output_dir, exist_ok=True)
+    tile_index_file = os.path.join(output_dir, 'tile_index.csv')
+
+    # Continue column block numbering when appending to an existing tiled layout
+    append = col_offset > 0 and os.path.exists(tile_index_file)
+    first_col_block = pd.read_csv(tile_index_file)['col_start'].nunique() if append else 0
+
+    n_rows, n_cols = current_values.shape
+    tiles = []
+    for r, row_start in enumerate(range(0, n_rows, row_block)):
+        row_stop = min(row_start + row_block, n_rows)
+        for c, col_start in enumerate(range(0, n_cols, col_block)):
+            col_stop = min(col_start + col_block, n_cols)
+
+            tile_file = f"current_values_tile_{r}_{first_col_block + c}.npy"
+            np.save(os.path.join(output_dir, tile_file), current_values[row_start:row_stop, col_start:col_stop])
+            tiles.append((tile_file, row_start, row_stop, col_offset + col_start, col_offset + col_stop))
+
+    # Save tile index (one row per tile with its row and column ranges)
+    tile_index = pd.DataFrame(tiles, columns=['tile_file', 'row_start', 'row_stop', 'col_start', 'col_stop'])
+    tile_index.to_csv(tile_index_file, mode='a' if append else 'w', index=False, header=not append)
+    print(f"Saved {len(tiles)} tiles to {output_dir}")
+
+
+def tile_chunks(data_dir: str, prefix: str, index_fname: str, tiles_dir: str, row_block=256, col_block=20000,
+                incremental=False):
+    """
+    Creates the tiled layout (see `save_in_tiles`) for any chunked output and its multiindex, e.g.
+    `membrane_currents_merged_soma` or `axial_currents_merged_soma`.
+
+    If `data_dir` has a manifest, only the chunks recorded in it are tiled, up to the first chunk that is
+    missing from it, so the tiles always cover a contiguous time range of completely written chunks.
+
+    Parameters:
+        data_dir (str): The directory containing the `.npy` value chunks.
+        prefix (str): The file name prefix of the chunks (e.g. 'merged_soma_values').
+        index_fname (str): The file path to the CSV file containing the multiindex of the chunks.
+        tiles_dir (str): The directory where the tiles, `tile_index.csv` and `multiindex.csv` will be saved.
+        row_block (int): The number of rows to save per tile (default is 256).
+        col_block (int): The number of columns (timepoints) to save per tile (default is 20000).
+        incremental (bool): If True, only chunks beyond the timepoints already in the tile index are tiled.
+            All chunks are tiled again if a chunk was rewritten after it was tiled.
+    """
+    import pandas as pd
+    chunk_files = list_chunk_files(data_dir, prefix)
+    manifest_file = os.path.join(data_dir, 'manifest.csv')
+    if os.path.exists(manifest_file):
+        recorded = set(pd.read_csv(manifest_file)['chunk_file'])
+        n_tileable = 0
+        for i, chunk_file in enumerate(chunk_files):
+            if chunk_file not in recorded or chunk_number(chunk_file, prefix) != i:
+                break
+            n_tileable += 1
+        chunk_files = chunk_files[:n_tileable]
+
+    # Column range of each chunk
+    chunks = []
+    col_offset = 0
+    for chunk_file in chunk_files:
+        n_cols = np.load(os.path.join(data_dir, chunk_file), mmap_mode='r').shape[1]
+        chunks.append((chunk_file, col_offset))
+        col_offset += n_cols
+
+    tile_index_file = os.path.join(tiles_dir, 'tile_index.csv')
+    tiled_until = 0
+    if incremental and os.path.exists(tile_index_file):
+        tiled_until = pd.read_csv(tile_index_file)['col_stop'].max()
+        tiled_mtime = os.stat(tile_index_file).st_mtime_ns
+        rewritten = [os.stat(os.path.join(data_dir, f)).st_mtime_ns > tiled_mtime for f, c in chunks if c < tiled_until]
+        if tiled_until > col_offset or any(rewritten):
+            tiled_until = 0
+
+    for chunk_file, chunk_offset in chunks:
+        if chunk_offset >= tiled_until:
+            values = np.load(os.path.join(data_dir, chunk_file), mmap_mode='r')
+            save_in_tiles(values, tiles_dir, row_block=row_block, col_block=col_block, col_offset=chunk_offset)
+
+    if chunks:
+        shutil.copyfile(index_fname, os.path.join(tiles_dir, 'multiindex.csv'))
+
+
+def load_tiles(tiles_dir: str, rows, start: int = 0, stop: int = None) -> np.ndarray:
+    """
+    Loads the values of the given rows between timepoints `start` and `stop` from a tiled layout.
+    Only the tiles covering the requested rows and time range are opened, and only the requested
+    rows of each tile are read (tiles are memory-mapped).
+
+    Parameters:
+        tiles_dir (str): The directory containing `tile_index.csv` and the `.npy` tiles.
+        rows (array-like of int): Row positions to load (in the order they should be returned).
+        start (int): The first timepoint to load (default is 0).
+        stop (int): The timepoint after the last one to load (default is the end of the recording).
+
+    Returns:
+        numpy.ndarray: An array of shape (len(rows), stop - start).
+
+    Raises:
+        IndexError: If a requested row is outside of the tiled data.
+        ValueError: If the requested time range is outside of the tiled data, or a requested value is not covered by any tile.
+    """
+    import pandas as pd
+    tile_index = pd.read_csv(os.path.join(tiles_dir, 'tile_index.csv'))
+    rows = np.asarray(rows, dtype=int)
+    n_rows = tile_index['row_stop'].max()
+    n_cols = tile_index['col_stop'].max()
+    if stop is None:
+        stop = n_cols
+    if start < 0 or start > stop or stop > n_cols:
+        raise ValueError(f"Timepoints {start}:{stop} are outside of the tiled data (0:{n_cols})")
+    if np.any((rows < 0) | (rows >= n_rows)):
+        raise IndexError(f"Rows are outside of the tiled data (0:{n_rows})")
+
+    # Select tiles overlapping the requested time range and containing at least one requested row
+    time_mask = (tile_index['col_start'] < stop) & (tile_index['col_stop'] > start)
+    row_mask = [np.any((rows >= r0) & (rows < r1)) for r0, r1 in zip(tile_index['row_start'], tile_index['row_stop'])]
+    tiles = tile_index[time_mask & np.array(row_mask, dtype=bool)]
+
+    dtype = np.load(os.path.join(tiles_dir, tile_index['tile_file'].iloc[0]), mmap_mode='r').dtype
+    values = np.empty((len(rows), stop - start), dtype=dtype)
+    filled = np.zeros(values.shape, dtype=bool)
+    for tile in tiles.itertuples(index=False):
+        tile_values = np.load(os.path.join(tiles_dir, tile.tile_file), mmap_mode='r')
+
+        out_rows = np.flatnonzero((rows >= tile.row_start) & (rows < tile.row_stop))
+        col_start = max(start, tile.col_start)
+        col_stop = min(stop, tile.col_stop)
+        values[out_rows, col_start - start:col_stop - start] = tile_values[rows[out_rows] - tile.row_start,
+                                                                           col_start - tile.col_start:col_stop - tile.col_start]
+        filled[out_rows, col_start - start:col_stop - start] = True
+
+    if not filled.all():
+        row, col = np.argwhere(~filled)[0]
+        raise ValueError(f"Row {rows[row]} at timepoint {start + col} is not covered by any tile")
+    return values
+
+
+def load_df_tiled(index_fname: str, tiles_dir: str, segments=None, sections=None, start: int = 0, stop: int = None):
+    """
+    Loads a DataFrame from a CSV file containing a multiindex and a tiled layout created by `save_in_tiles`,
+    reading only the rows that belong to the given segments or sections.
+
+    Parameters:
+        index_fname (str): The file path to the CSV file containing the multiindex data.
+        tiles_dir (str): The directory containing `tile_index.csv` and the `.npy` tiles.
+        segments (list of str): Segment names to load. A row is selected if any level of its index
+            matches (e.g. both 'ref' and 'par' for axial currents).
+        sections (list of str): Section names to load. A row is selected if any level of its index
+            is a segment of the section (starts with f'{section}(').
+        start (int): The first timepoint to load (default is 0).
+        stop (int): The timepoint after the last one to load (default is the end of the recording).
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame with the selected rows and timepoints as columns.
+        Loads all rows if neither segments nor sections are given.
+
+    Raises:
+        ValueError: If segments or sections are given but no rows match them.
+    """
+    import pandas as pd
+    index = pd.read_csv(index_fname)
+    if segments is None and sections is None:
+        mask = np.ones(len(index), dtype=bool)
+    else:
+        mask = np.zeros(len(index), dtype=bool)
+        if segments is not None:
+            mask |= index.isin(list(segments)).any(axis=1).values
+        if sections is not None:
+            prefixes = tuple(f'{section}(' for section in sections)
+            for level in index.columns:
+                mask |= index[level].astype(str).str.startswith(prefixes).values
+        if not mask.any():
+            raise ValueError(f"No rows match segments {segments} or sections {sections}")
+    rows = np.flatnonzero(mask)
+
+    values = load_tiles(tiles_dir, rows, start, stop)
+    multiindex = pd.MultiIndex.from_frame(index.iloc[rows])
+    df = pd.DataFrame(data=values, index=multiindex, columns=range(start, start + values.shape[1]))
+    return df
 
 
 def load_df(index_fname: str, values_fname: str):
@@ -44,6 +462,7 @@ def load_df(index_fname: str, values_fname: str):
     Returns:
         pd.DataFrame: A pandas DataFrame constructed using the multiindex from the CSV file and the values from the .npy file.
     """
+    import pandas as pd
     index = pd.read_csv(index_fname)
     values = np.load(values_fname)
 
@@ -71,6 +490,7 @@ def get_iax(df_iax, segment):
     pd.DataFrame
         A DataFrame containing the axial currents for the given segment.
     """
+    import pandas as pd
     ref_mask = df_iax.index.get_level_values("ref") == segment
     ref_iax = -1 * df_iax[ref_mask]
 
@@ -102,6 +522,7 @@ def create_directed_graph(df_iax: pd.DataFrame, tp: int) -> nx.DiGraph:
        A directed graph where nodes represent segments,
        and directed edges are created based on the sign of `iax` at the specified time point.
    """
+    import networkx as nx
     df_iax_tp = df_iax[tp]
     df_iax_tp = df_iax_tp.reset_index()
     df_iax_tp.rename(columns={tp: "iax"}, inplace=True)  # has three columns: ref, par, iax